@@ -5,16 +5,27 @@ Handles OAuth2 authentication for Gmail and Calendar APIs with enhanced security
 """
 
 import os
+import ctypes
+import errno
 import pickle
 import json
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+import httplib2
 from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
+from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 
+# Socket timeout for API calls; httplib2 keeps the connection alive between requests
+HTTP_TIMEOUT = 20
+
 class GoogleAPIAuth:
-    def __init__(self, credentials_file="credentials.json"):
+    def __init__(self, credentials_file="credentials.json", stale_window=timedelta(minutes=5)):
         # Setup secure logging
         self.logger = logging.getLogger('google_auth')
         self.logger.setLevel(logging.INFO)
@@ -29,7 +40,19 @@ class GoogleAPIAuth:
         self.credentials_file = Path(credentials_file)
         self.secure_dir = Path.home() / '.viber_scheduler' / 'auth'
         self.secure_dir.mkdir(parents=True, exist_ok=True, mode=0o700)
-        self.token_file = self.secure_dir / "token.pickle"
+        self.token_file = self.secure_dir / "token.json"
+        self.legacy_token_file = self.secure_dir / "token.pickle"
+        
+        # Credentials and built services are reused for the lifetime of the instance
+        self._creds = None
+        self._gmail_service = None
+        self._calendar_service = None
+        
+        # Tokens closer than stale_window to expiry are refreshed in the background
+        self.stale_window = stale_window
+        self._refresh_lock = threading.Lock()
+        self._refresh_executor = None
+        self._refresh_future = None
         
         # Define scopes for Gmail and Calendar access
         self.SCOPES = [
@@ -41,19 +64,121 @@ class GoogleAPIAuth:
         ]
         
         self.logger.info("Google API Auth initialized with secure storage")
+    
+    def _lock_memory(self, buf):
+        """mlock a bytearray so the secret it holds is never swapped out"""
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            addr = ctypes.addressof((ctypes.c_char * len(buf)).from_buffer(buf))
+            if libc.mlock(ctypes.c_void_p(addr), ctypes.c_size_t(len(buf))) == 0:
+                return True
+            err = ctypes.get_errno()
+            # EPERM/ENOMEM usually mean RLIMIT_MEMLOCK is too small; keep going unlocked
+            self.logger.warning(f"mlock unavailable ({errno.errorcode.get(err, err)}), token buffer not locked")
+        except (OSError, AttributeError) as e:
+            self.logger.warning(f"mlock unavailable ({e}), token buffer not locked")
+        return False
+    
+    def _wipe_memory(self, buf, locked):
+        """Zeroize a bytearray in place and release its memory lock"""
+        addr = ctypes.addressof((ctypes.c_char * len(buf)).from_buffer(buf))
+        ctypes.memset(addr, 0, len(buf))
+        if locked:
+            ctypes.CDLL(None).munlock(ctypes.c_void_p(addr), ctypes.c_size_t(len(buf)))
+    
+    def _load_token(self):
+        """Load stored credentials, migrating a legacy pickle token to JSON once"""
+        if self.token_file.exists():
+            # Read straight into a locked buffer and wipe it once parsed
+            buf = bytearray(self.token_file.stat().st_size)
+            locked = bool(buf) and self._lock_memory(buf)
+            try:
+                with open(self.token_file, 'rb', buffering=0) as token:
+                    token.readinto(buf)
+                return Credentials.from_authorized_user_info(json.loads(buf), self.SCOPES)
+            finally:
+                if buf:
+                    self._wipe_memory(buf, locked)
         
+        if self.legacy_token_file.exists():
+            self.logger.info("Migrating legacy pickle token to JSON storage")
+            with open(self.legacy_token_file, 'rb') as token:
+                creds = pickle.load(token)
+            self._save_token(creds)
+            self.legacy_token_file.unlink()
+            return creds
+        
+        return None
+    
+    def _save_token(self, creds):
+        """Persist credentials as JSON with owner-only permissions"""
+        # Write to temp file first, then atomic rename, so a crash never leaves a truncated token
+        temp_file = self.token_file.with_suffix('.tmp')
+        
+        # Create with secure permissions from the start
+        fd = os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as token:
+            token.write(creds.to_json().encode())
+        temp_file.chmod(0o600)
+        
+        os.replace(temp_file, self.token_file)
+        
+    def _is_stale(self, creds):
+        """True when a still-valid token is within the stale window of its expiry"""
+        if not creds.refresh_token or not creds.expiry:
+            return False
+        # google-auth keeps expiry as a naive UTC datetime
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return creds.expiry - now < self.stale_window
+    
+    def _refresh_in_background(self, creds):
+        """Refresh and persist credentials off the request path"""
+        try:
+            creds.refresh(Request())
+            self._save_token(creds)
+            self.logger.info("Credentials refreshed in background")
+        except Exception as e:
+            self.logger.warning(f"Background credential refresh failed: {str(e)}")
+    
+    def _schedule_refresh(self, creds):
+        """Start a background refresh unless one is already pending"""
+        with self._refresh_lock:
+            if self._refresh_future and not self._refresh_future.done():
+                return
+            if self._refresh_executor is None:
+                self._refresh_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='token_refresh')
+            self._refresh_future = self._refresh_executor.submit(self._refresh_in_background, creds)
+    
+    def _wait_for_refresh(self):
+        """Block until a pending background refresh has finished"""
+        with self._refresh_lock:
+            future = self._refresh_future
+        if future:
+            future.result()
+    
     def authenticate(self):
         """
         Authenticate and return credentials with enhanced security
         """
-        creds = None
+        if self._creds and self._creds.valid:
+            # Serve the current token now; renew it before it actually expires
+            if self._is_stale(self._creds):
+                self._schedule_refresh(self._creds)
+            return self._creds
+        
+        # An in-flight background refresh may be about to revive the token
+        self._wait_for_refresh()
+        if self._creds and self._creds.valid:
+            return self._creds
+        
+        creds = self._creds
         
         try:
-            # Check if secure token file exists
-            if self.token_file.exists():
-                self.logger.info("Loading existing credentials from secure storage")
-                with open(self.token_file, 'rb') as token:
-                    creds = pickle.load(token)
+            # Load stored credentials from secure storage
+            if not creds:
+                creds = self._load_token()
+                if creds:
+                    self.logger.info("Loaded existing credentials from secure storage")
         
             # If there are no valid credentials, get new ones
             if not creds or not creds.valid:
@@ -77,38 +202,54 @@ class GoogleAPIAuth:
                     creds = flow.run_local_server(port=0)
                 
                 # Save credentials securely
-                with open(self.token_file, 'wb') as token:
-                    pickle.dump(creds, token)
-                
-                # Set secure permissions
-                self.token_file.chmod(0o600)
+                self._save_token(creds)
                 self.logger.info(f"Credentials saved securely to {self.token_file}")
                 print("✅ Authentication successful!")
             
+            self._creds = creds
             return creds
             
         except Exception as e:
             self.logger.error(f"Authentication failed: {str(e)}")
             raise
     
+    def _authorized_http(self, creds):
+        """One kept-alive, timeout-bounded HTTP client per service, signing with creds"""
+        return AuthorizedHttp(creds, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+    
     def get_gmail_service(self):
-        """Get Gmail API service"""
+        """Get Gmail API service (built once per instance)"""
         creds = self.authenticate()
-        if creds:
-            return build('gmail', 'v1', credentials=creds)
-        return None
+        if creds and self._gmail_service is None:
+            # Discovery documents bundled with the client; no discovery cache lookups or fetches
+            self._gmail_service = build('gmail', 'v1', http=self._authorized_http(creds),
+                                        cache_discovery=False, static_discovery=True)
+        return self._gmail_service
     
     def get_calendar_service(self):
-        """Get Calendar API service"""
+        """Get Calendar API service (built once per instance)"""
         creds = self.authenticate()
-        if creds:
-            return build('calendar', 'v3', credentials=creds)
-        return None
+        if creds and self._calendar_service is None:
+            self._calendar_service = build('calendar', 'v3', http=self._authorized_http(creds),
+                                           cache_discovery=False, static_discovery=True)
+        return self._calendar_service
     
     def test_connection(self):
         """Test if authentication works"""
         print("🧪 Testing Google API connections...")
         
+        # Authenticate once; both services below reuse these credentials
+        try:
+            creds = self.authenticate()
+        except Exception as e:
+            print(f"❌ Authentication error: {e}")
+            return
+        
+        if not creds:
+            print("❌ Gmail: Connection failed")
+            print("❌ Calendar: Connection failed")
+            return
+        
         # Test Gmail
         try:
             gmail_service = self.get_gmail_service()
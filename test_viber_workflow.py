@@ -5,18 +5,84 @@ Test script to demonstrate the Viber missed call → Calendar workflow
 
 from datetime import datetime, timedelta
 from google_auth import GoogleAPIAuth
+import atexit
 import subprocess
 
-def create_test_calendar_event():
+# Long-lived interactive osascript; each notification is one line on its stdin
+_osa = None
+
+def _applescript_string(value):
+    """Quote a value as an AppleScript string literal"""
+    escaped = value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return f'"{escaped}"'
+
+def _close_osascript():
+    if _osa is not None and _osa.poll() is None:
+        _osa.stdin.close()
+        _osa.wait(timeout=5)
+
+atexit.register(_close_osascript)
+
+def notify(title, subtitle, message):
+    """Display a macOS notification through the shared osascript process"""
+    global _osa
+    script = (f"display notification {_applescript_string(message)} "
+              f"with title {_applescript_string(title)} "
+              f"subtitle {_applescript_string(subtitle)}\n")
+    
+    if _osa is None or _osa.poll() is not None:
+        _osa = subprocess.Popen(['osascript', '-i'], stdin=subprocess.PIPE,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                text=True)
+    
+    _osa.stdin.write(script)
+    _osa.stdin.flush()
+
+def _build_event(summary, description, start_dt, duration=timedelta(minutes=15), tz='Europe/Budapest'):
+    """Build a calendar event body with a popup reminder at start time"""
+    end_iso = (start_dt + duration).isoformat()
+    return {
+        'summary': summary,
+        'description': description,
+        'start': {
+            'dateTime': start_dt.isoformat(),
+            'timeZone': tz,
+        },
+        'end': {
+            'dateTime': end_iso,
+            'timeZone': tz,
+        },
+        'reminders': {
+            'useDefault': False,
+            'overrides': [
+                {'method': 'popup', 'minutes': 0},
+            ],
+        },
+    }
+
+def insert_events(calendar, events):
+    """Insert events in one batch HTTP request, returning created events in order"""
+    created = [None] * len(events)
+    errors = []
+    
+    def on_created(request_id, response, exception):
+        if exception is not None:
+            errors.append(exception)
+        else:
+            created[int(request_id)] = response
+    
+    batch = calendar.new_batch_http_request(callback=on_created)
+    for i, event in enumerate(events):
+        batch.add(calendar.events().insert(calendarId='primary', body=event), request_id=str(i))
+    batch.execute()
+    
+    if errors:
+        raise errors[0]
+    return created
+
+def create_test_calendar_event(calendar):
     """Create a test calendar event to demonstrate the workflow"""
     
-    print("🧪 Testing Viber Missed Call → Calendar Workflow")
-    print("=" * 50)
-    
-    # Initialize Google Calendar
-    auth = GoogleAPIAuth()
-    calendar = auth.get_calendar_service()
-    
     # Simulate a missed call
     caller_name = "Teszt János"
     call_time = datetime.now() - timedelta(minutes=5)  # 5 minutes ago
@@ -37,30 +103,10 @@ def create_test_calendar_event():
                 f"Missed call time: {call_time.strftime('%H:%M')}\n" \
                 f"Number of missed calls: {missed_count}"
     
-    event = {
-        'summary': title,
-        'description': description,
-        'start': {
-            'dateTime': followup_time.isoformat(),
-            'timeZone': 'Europe/Budapest',
-        },
-        'end': {
-            'dateTime': (followup_time + timedelta(minutes=15)).isoformat(),
-            'timeZone': 'Europe/Budapest',
-        },
-        'reminders': {
-            'useDefault': False,
-            'overrides': [
-                {'method': 'popup', 'minutes': 0},
-            ],
-        },
-    }
+    event = _build_event(title, description, followup_time)
     
     try:
-        created_event = calendar.events().insert(
-            calendarId='primary', 
-            body=event
-        ).execute()
+        created_event = insert_events(calendar, [event])[0]
         
         print(f"✅ Calendar event created successfully!")
         print(f"   Title: {title}")
@@ -86,23 +132,16 @@ def send_test_notification(caller_name, call_time, followup_time):
     subtitle = f"{caller_name}"
     message = f"Missed: {call_time.strftime('%H:%M')}\n✅ Callback scheduled: {followup_time.strftime('%H:%M')}"
     
-    applescript = f'''
-    display notification "{message}" with title "{title}" subtitle "{subtitle}"
-    '''
-    
     try:
-        subprocess.run(['osascript', '-e', applescript], check=True)
+        notify(title, subtitle, message)
         print(f"📱 Notification sent: {caller_name}")
     except Exception as e:
         print(f"⚠️ Notification error: {e}")
 
-def test_multiple_calls():
+def test_multiple_calls(calendar):
     """Test multiple missed calls from same person"""
     print(f"\n🔄 Testing multiple missed calls scenario...")
     
-    auth = GoogleAPIAuth()
-    calendar = auth.get_calendar_service()
-    
     caller_name = "Anna Kovács"
     call_time = datetime.now() - timedelta(minutes=2)
     missed_count = 3  # Third missed call
@@ -116,30 +155,10 @@ def test_multiple_calls():
                 f"Number of missed calls: {missed_count}\n" \
                 f"⚠️ Multiple attempts - might be important!"
     
-    event = {
-        'summary': title,
-        'description': description,
-        'start': {
-            'dateTime': followup_time.isoformat(),
-            'timeZone': 'Europe/Budapest',
-        },
-        'end': {
-            'dateTime': (followup_time + timedelta(minutes=15)).isoformat(),
-            'timeZone': 'Europe/Budapest',
-        },
-        'reminders': {
-            'useDefault': False,
-            'overrides': [
-                {'method': 'popup', 'minutes': 0},
-            ],
-        },
-    }
+    event = _build_event(title, description, followup_time)
     
     try:
-        created_event = calendar.events().insert(
-            calendarId='primary', 
-            body=event
-        ).execute()
+        created_event = insert_events(calendar, [event])[0]
         
         print(f"✅ URGENT calendar event created!")
         print(f"   Title: {title}")
@@ -150,22 +169,25 @@ def test_multiple_calls():
         urgent_subtitle = f"{caller_name} - SÜRGŐS"
         urgent_message = f"Utolsó hívás: {call_time.strftime('%H:%M')}\n⚠️ {missed_count} elmulasztott hívás!\n✅ Visszahívási emlékeztető: {followup_time.strftime('%H:%M')}"
         
-        applescript = f'''
-        display notification "{urgent_message}" with title "{urgent_title}" subtitle "{urgent_subtitle}"
-        '''
-        
-        subprocess.run(['osascript', '-e', applescript], check=True)
+        notify(urgent_title, urgent_subtitle, urgent_message)
         print(f"📱 URGENT notification sent!")
         
     except Exception as e:
         print(f"❌ Error: {e}")
 
 if __name__ == "__main__":
+    print("🧪 Testing Viber Missed Call → Calendar Workflow")
+    print("=" * 50)
+    
+    # Initialize Google Calendar once for both scenarios
+    auth = GoogleAPIAuth()
+    calendar = auth.get_calendar_service()
+    
     # Test basic workflow
-    create_test_calendar_event()
+    create_test_calendar_event(calendar)
     
     # Test multiple calls scenario
-    test_multiple_calls()
+    test_multiple_calls(calendar)
     
     print(f"\n🎉 All tests completed!")
     print(f"📅 Check your Google Calendar for 2 new events")
@@ -0,0 +1,50 @@
+"""Shared fixtures: an isolated HOME and state database for each tracker"""
+import os
+import sys
+import tempfile
+import types
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# The tracker resolves its data, log and PID paths from HOME at import time
+os.environ['HOME'] = tempfile.mkdtemp(prefix='viber-scheduler-tests-')
+
+try:
+    import google_auth  # noqa: F401
+except ImportError:
+    # The Google client libraries are only needed once the calendar is touched
+    google_auth = types.ModuleType('google_auth')
+    google_auth.GoogleAPIAuth = None
+    sys.modules['google_auth'] = google_auth
+
+import viber_missed_calls_v2 as tracker_module
+
+
+@pytest.fixture
+def state_db(tmp_path, monkeypatch):
+    """Point the tracker at a fresh state database; run from tmp_path for the manual file"""
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir(mode=0o700)
+    monkeypatch.setattr(tracker_module, 'DATA_DIR', data_dir)
+    monkeypatch.setattr(tracker_module, 'STATE_DB_PATH', data_dir / 'state.db')
+    monkeypatch.setattr(tracker_module, 'NOTIFICATION_DB_PATH', tmp_path / 'missing' / 'db')
+    monkeypatch.chdir(tmp_path)
+    return data_dir / 'state.db'
+
+
+@pytest.fixture
+def make_tracker(state_db):
+    """Build trackers on the fresh state database, closing them afterwards"""
+    trackers = []
+    
+    def make():
+        tracker = tracker_module.ViberMissedCallTracker()
+        trackers.append(tracker)
+        return tracker
+    
+    yield make
+    for tracker in trackers:
+        tracker._db.close()
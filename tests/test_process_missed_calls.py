@@ -0,0 +1,164 @@
+"""Tests for process_missed_calls: report coalescing and the notification cursor"""
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import viber_missed_calls_v2 as v
+
+
+class FakeCalendar:
+    """Calendar service double: an empty 6-10 PM window and batch inserts that can fail per caller"""
+    
+    def __init__(self):
+        self.inserted = []
+        self.failing = set()
+    
+    def events(self):
+        return self
+    
+    def list(self, **kwargs):
+        return self
+    
+    def execute(self):
+        return {'items': []}
+    
+    def insert(self, calendarId, body):
+        return body
+    
+    def new_batch_http_request(self, callback):
+        return FakeBatch(self, callback)
+
+
+class FakeBatch:
+    def __init__(self, calendar, callback):
+        self.calendar = calendar
+        self.callback = callback
+        self.requests = []
+    
+    def add(self, body, request_id):
+        self.requests.append((request_id, body))
+    
+    def execute(self):
+        for request_id, body in self.requests:
+            if any(caller in body['summary'] for caller in self.calendar.failing):
+                self.callback(request_id, None, RuntimeError('insert failed'))
+            else:
+                self.calendar.inserted.append(body['summary'])
+                self.callback(request_id, {'id': f'event{len(self.calendar.inserted)}'}, None)
+
+
+class FakeAuth:
+    def __init__(self, calendar):
+        self.calendar = calendar
+    
+    def get_calendar_service(self):
+        return self.calendar
+
+
+@pytest.fixture
+def notification_db(state_db, monkeypatch):
+    """A NotificationCenter-shaped database the tracker reads Viber notifications from"""
+    path = state_db.parent.parent / 'NotificationCenter' / 'db'
+    path.parent.mkdir()
+    conn = sqlite3.connect(str(path))
+    conn.execute('CREATE TABLE record (bundleid TEXT, data BLOB, delivered_date REAL)')
+    conn.commit()
+    monkeypatch.setattr(v, 'NOTIFICATION_DB_PATH', path)
+    
+    def deliver(caller, minutes_ago):
+        """Add a missed call notification; returns its local time and delivered_date"""
+        delivered = time.time() - v.CORE_DATA_EPOCH_OFFSET - minutes_ago * 60
+        with conn:
+            conn.execute('INSERT INTO record VALUES (?, ?, ?)',
+                         (v.VIBER_BUNDLE_ID, f'Missed call from {caller}'.encode(), delivered))
+        local = datetime.fromtimestamp(delivered + v.CORE_DATA_EPOCH_OFFSET).replace(microsecond=0)
+        return local, delivered
+    
+    deliver.conn = conn
+    yield deliver
+    conn.close()
+
+
+@pytest.fixture
+def tracker(notification_db, make_tracker, monkeypatch):
+    tracker = make_tracker()
+    tracker._auth = FakeAuth(FakeCalendar())
+    monkeypatch.setattr(tracker, 'send_notification', lambda *args: None)
+    return tracker
+
+
+def _calendar(tracker):
+    return tracker._auth.calendar
+
+
+def test_cursor_advances_once_every_followup_is_inserted(tracker, notification_db):
+    notification_db('Anna', 3)
+    _, newest = notification_db('Bela', 2)
+    
+    assert tracker.process_missed_calls() == 2
+    assert sorted(_calendar(tracker).inserted) == ['📞 Call back: Anna', '📞 Call back: Bela']
+    assert tracker._nc_cursor == newest
+    
+    assert tracker.process_missed_calls() == 0
+    assert len(_calendar(tracker).inserted) == 2
+
+
+def test_cursor_stays_put_after_a_failed_insert(tracker, notification_db):
+    notification_db('Anna', 3)
+    _, newest = notification_db('Bela', 2)
+    _calendar(tracker).failing.add('Bela')
+    
+    assert tracker.process_missed_calls() == 1
+    assert tracker._nc_cursor is None
+    
+    # Bela's notification is read again and retried; Anna's is already processed
+    _calendar(tracker).failing.clear()
+    assert tracker.process_missed_calls() == 1
+    assert _calendar(tracker).inserted == ['📞 Call back: Anna', '📞 Call back: Bela']
+    assert tracker.missed_call_counts == {'Anna': 1, 'Bela': 1}
+    assert tracker._nc_cursor == newest
+
+
+def test_cursor_stays_put_after_a_query_error(tracker, notification_db):
+    notification_db('Anna', 2)
+    _calendar(tracker).failing.add('Anna')
+    assert tracker.process_missed_calls() == 0
+    
+    # The failed cycle's rows must not be committed by a cycle whose query failed
+    with notification_db.conn:
+        notification_db.conn.execute('ALTER TABLE record RENAME TO record_moved')
+    assert tracker.process_missed_calls() == 0
+    assert tracker._nc_cursor is None
+    
+    with notification_db.conn:
+        notification_db.conn.execute('ALTER TABLE record_moved RENAME TO record')
+    _calendar(tracker).failing.clear()
+    assert tracker.process_missed_calls() == 1
+
+
+def test_manual_duplicate_of_a_processed_notification_is_marked_not_rescheduled(tracker, notification_db):
+    call_time, _ = notification_db('Anna', 3)
+    notification_db('Bela', 2)
+    _calendar(tracker).failing.add('Bela')
+    assert tracker.process_missed_calls() == 1
+    
+    # Anna's notification is still read (the cursor is held back by Bela) alongside her manual entry
+    with open(v.MANUAL_CALLS_FILE, 'a') as f:
+        f.write(f"{call_time.strftime('%Y-%m-%d %H:%M')} | Anna\n")
+    _calendar(tracker).failing.clear()
+    assert tracker.process_missed_calls() == 1
+    assert _calendar(tracker).inserted == ['📞 Call back: Anna', '📞 Call back: Bela']
+    assert tracker.check_manual_missed_calls() == []
+
+
+def test_manual_duplicate_added_after_the_cursor_passed_is_not_rescheduled(tracker, notification_db):
+    call_time, newest = notification_db('Anna', 3)
+    assert tracker.process_missed_calls() == 1
+    assert tracker._nc_cursor == newest
+    
+    with open(v.MANUAL_CALLS_FILE, 'a') as f:
+        f.write(f"{call_time.strftime('%Y-%m-%d %H:%M')} | Anna\n")
+    assert tracker.process_missed_calls() == 0
+    assert _calendar(tracker).inserted == ['📞 Call back: Anna']
@@ -0,0 +1,196 @@
+"""Unit tests for call ID migration, the manual file reader and callback slot allocation"""
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import viber_missed_calls_v2 as v
+
+
+def _recent(hours=1):
+    return (datetime.now() - timedelta(hours=hours)).strftime('%Y-%m-%d %H:%M')
+
+
+# --- Call ID migration ---
+
+def test_call_id_is_fixed_size_and_stable():
+    call_id = v.make_call_id('2025-10-14 10:00', 'Anna ' * 50)
+    assert len(call_id) == 24
+    assert call_id == v.make_call_id('2025-10-14 10:00', 'Anna ' * 50)
+    assert call_id != v.make_call_id('2025-10-14 10:01', 'Anna ' * 50)
+    assert call_id == v.make_call_id('2025-10-14 10:00:59', 'Anna ' * 50)
+
+
+def test_legacy_call_id_splits_at_first_underscore():
+    assert v.legacy_call_id('2025-10-14 10:00_Anna_B') == v.make_call_id('2025-10-14 10:00', 'Anna_B')
+
+
+def test_json_ids_are_migrated_without_reprocessing(make_tracker, state_db):
+    time_str = _recent()
+    (state_db.parent / 'viber_missed_calls.json').write_text(json.dumps({
+        'processed_calls': [f'{time_str}_Anna'],
+        'missed_call_counts': {'Anna': 2},
+        'last_updated': datetime.now().isoformat(),
+    }))
+    v.MANUAL_CALLS_FILE.write_text(f'{time_str} | Anna\n{time_str} | Bela\n')
+    
+    tracker = make_tracker()
+    
+    assert [call['caller'] for call in tracker.check_manual_missed_calls()] == ['Bela']
+    assert tracker.missed_call_counts['Anna'] == 2
+    assert not (state_db.parent / 'viber_missed_calls.json').exists()
+    assert (state_db.parent / 'viber_missed_calls.json.migrated').exists()
+
+
+# --- Manual file offset reader ---
+
+@pytest.fixture
+def manual_file(make_tracker):
+    tracker = make_tracker()
+    path = v.MANUAL_CALLS_FILE
+    path.write_text('')
+    
+    def read():
+        return [entry['caller'] for entry in tracker._read_manual_missed_calls(path, path.stat())]
+    
+    read.tracker = tracker
+    return path, read
+
+
+def test_reader_only_parses_appended_lines(manual_file):
+    path, read = manual_file
+    path.write_text('2025-10-14 10:00 | Anna\n')
+    assert read() == ['Anna']
+    
+    with open(path, 'a') as f:
+        f.write('2025-10-14 11:00 | Bela\n')
+    assert read() == ['Anna', 'Bela']
+    assert read.tracker._manual_read[1] == path.stat().st_size
+
+
+def test_reader_rereads_a_partial_line_until_it_is_complete(manual_file):
+    path, read = manual_file
+    path.write_text('2025-10-14 10:00 | Anna\n2025-10-14 11:00 | Be')
+    assert read() == ['Anna', 'Be']
+    assert read.tracker._manual_read[1] == len('2025-10-14 10:00 | Anna\n')
+    
+    with open(path, 'a') as f:
+        f.write('la\n')
+    assert read() == ['Anna', 'Bela']
+
+
+def test_reader_starts_over_after_truncation(manual_file):
+    path, read = manual_file
+    path.write_text('2025-10-14 10:00 | Anna\n2025-10-14 11:00 | Bela\n')
+    assert read() == ['Anna', 'Bela']
+    
+    path.write_text('2025-10-14 12:00 | Cili\n')
+    assert read() == ['Cili']
+
+
+def test_reader_starts_over_when_the_file_is_replaced(manual_file):
+    path, read = manual_file
+    path.write_text('2025-10-14 10:00 | Anna\n')
+    assert read() == ['Anna']
+    
+    replacement = path.with_name('manual_missed_calls.txt.new')
+    replacement.write_text('2025-10-14 10:00 | Anna\n2025-10-14 11:00 | Bela\n')
+    os.replace(replacement, path)
+    assert read() == ['Anna', 'Bela']
+
+
+def test_reader_starts_over_when_an_earlier_line_is_edited(manual_file):
+    path, read = manual_file
+    path.write_text('2025-10-14 10:00 | Anna\n2025-10-14 11:00 | Bela\n')
+    assert read() == ['Anna', 'Bela']
+    
+    path.write_text('2025-10-14 10:00 | Anni\n2025-10-14 11:00 | Bela\n2025-10-14 12:00 | Cili\n')
+    assert read() == ['Anni', 'Bela', 'Cili']
+
+
+def test_reader_notices_a_same_length_edit_far_before_the_offset(manual_file):
+    path, read = manual_file
+    tracker = read.tracker
+    path.unlink()
+    tracker._create_manual_template()
+    times = [_recent(hours) for hours in (4, 3, 2, 1)]
+    with open(path, 'a') as f:
+        for time_str, caller in zip(times, ('Anna', 'Bela', 'Cili', 'Dora')):
+            f.write(f'{time_str} | {caller}\n')
+    assert [call['caller'] for call in tracker.check_manual_missed_calls()] == ['Anna', 'Bela', 'Cili', 'Dora']
+    
+    content = path.read_text()
+    first = content.index(f'{times[0]} | Anna')
+    assert tracker._manual_read[1] - first > 64
+    edited = content.replace(f'{times[0]} | Anna', f'{times[0][:-1]}9 | Anne')
+    assert len(edited) == len(content)
+    path.write_text(edited)
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))  # Same size, so make sure mtime moves
+    
+    calls = tracker.check_manual_missed_calls()
+    assert [call['caller'] for call in calls] == ['Anne', 'Bela', 'Cili', 'Dora']
+    assert calls[0]['time'].minute % 10 == 9
+
+
+def test_future_entries_are_kept_until_they_come_into_range(manual_file):
+    path, read = manual_file
+    future = (datetime.now() + timedelta(days=2)).strftime('%Y-%m-%d %H:%M')
+    path.write_text(f'{future} | Anna\n')
+    assert read() == ['Anna']
+    assert read.tracker.check_manual_missed_calls() == []
+
+
+def test_unreadable_version_is_cached_so_the_wait_does_not_spin(manual_file):
+    path, read = manual_file
+    path.write_text(f'{_recent()} | Anna\n')
+    tracker = read.tracker
+    assert len(tracker.check_manual_missed_calls()) == 1
+    
+    with open(path, 'ab') as f:
+        f.write(f'{_recent()} | Kov\xe1cs\n'.encode('latin-1'))
+    assert len(tracker.check_manual_missed_calls()) == 1
+    stat = path.stat()
+    assert tracker._manual_cache[0] == (stat.st_mtime_ns, stat.st_size)
+
+
+# --- Busy slot mask ---
+
+BASE = datetime(2025, 10, 14, 18, 0)
+
+
+def _event(start, end):
+    return {'start': {'dateTime': f'2025-10-14T{start}:00+02:00'},
+            'end': {'dateTime': f'2025-10-14T{end}:00+02:00'}}
+
+
+@pytest.mark.parametrize('start, end, mask', [
+    ('17:00', '18:00', 0),                  # Ends exactly at the window start
+    ('22:00', '23:00', 0),                  # Starts exactly at the window end
+    ('17:00', '18:10', 0b1),                # Overlaps the first slot from before the window
+    ('18:15', '18:30', 0b10),               # Exactly one slot
+    ('18:20', '18:40', 0b110),              # Partial slots on both sides are busy
+    ('21:50', '23:00', 1 << 15),            # Overlaps the last slot past the window
+    ('17:00', '23:00', v._WINDOW_MASK),     # Covers the whole window
+])
+def test_busy_slot_mask_window_edges(make_tracker, start, end, mask):
+    assert make_tracker()._busy_slot_mask([_event(start, end)], BASE) == mask
+
+
+def test_busy_slot_mask_skips_all_day_events(make_tracker):
+    all_day = {'start': {'date': '2025-10-14'}, 'end': {'date': '2025-10-15'}}
+    assert make_tracker()._busy_slot_mask([all_day], BASE) == 0
+
+
+def test_allocate_slot_claims_each_free_slot_once(make_tracker):
+    tracker = make_tracker()
+    events = [_event('18:00', '18:30')]
+    assert tracker._allocate_slot(events, BASE) == BASE + timedelta(minutes=30)
+    assert tracker._allocate_slot(events, BASE) == BASE + timedelta(minutes=45)
+
+
+def test_allocate_slot_falls_back_to_window_end_when_full(make_tracker):
+    tracker = make_tracker()
+    assert tracker._first_free_slot(v._WINDOW_MASK) is None
+    assert tracker._allocate_slot([_event('18:00', '22:00')], BASE) == BASE + v._WINDOW_LEN
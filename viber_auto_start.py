@@ -10,6 +10,16 @@ import os
 import signal
 import sys
 from datetime import datetime
+from pathlib import Path
+
+# Written by viber_missed_calls_v2.py as soon as the monitor starts
+MONITOR_PID_FILE = Path.home() / '.viber_scheduler' / 'monitor.pid'
+
+# Healthy checks between "Monitor is running" heartbeats (12 x 5 min = 1 hour)
+HEARTBEAT_CHECKS = 12
+
+# Opened once and line-buffered so each message is a single write
+_LOG_FH = open("/Users/gergoorendi/viber_auto_start.log", "a", buffering=1)
 
 def log(message):
     """Log with timestamp"""
@@ -17,16 +27,16 @@ def log(message):
     print(f"[{timestamp}] {message}")
     
     # Also write to log file
-    with open("/Users/gergoorendi/viber_auto_start.log", "a") as f:
-        f.write(f"[{timestamp}] {message}\n")
+    _LOG_FH.write(f"[{timestamp}] {message}\n")
 
 def is_monitor_running():
     """Check if monitoring process is already running"""
     try:
-        result = subprocess.run(['pgrep', '-f', 'viber_missed_calls_v2.py'], 
-                              capture_output=True, text=True)
-        return len(result.stdout.strip()) > 0
-    except:
+        pid = int(MONITOR_PID_FILE.read_text().strip())
+        os.kill(pid, 0)
+        return True
+    except (OSError, ValueError):
+        # Missing/garbled PID file, or ProcessLookupError/PermissionError from kill
         return False
 
 def start_monitor():
@@ -53,6 +63,10 @@ def main():
     # Wait a bit for system to settle after wake/boot
     time.sleep(10)
     
+    # Only log state changes, plus an hourly heartbeat while healthy
+    last_state = None
+    checks_since_log = 0
+    
     try:
         while True:
             if not is_monitor_running():
@@ -60,12 +74,18 @@ def main():
                 start_monitor()
                 time.sleep(5)  # Give it time to start
                 
-                if is_monitor_running():
+                last_state = is_monitor_running()
+                checks_since_log = 0
+                if last_state:
                     log("✅ Monitor started successfully")
                 else:
                     log("❌ Failed to start monitor, will retry in 60 seconds")
             else:
-                log("✅ Monitor is running")
+                checks_since_log += 1
+                if last_state is not True or checks_since_log >= HEARTBEAT_CHECKS:
+                    log("✅ Monitor is running")
+                    checks_since_log = 0
+                last_state = True
             
             # Check every 5 minutes
             time.sleep(300)
@@ -6,17 +6,23 @@ Enhanced with comprehensive security improvements and operational features
 """
 
 import os
+import atexit
 import json
 import time
 import re
+import select
+import signal
+import sqlite3
 import subprocess
+import sys
 import logging
 import logging.handlers
+from collections import Counter
 from datetime import datetime, timedelta
 from typing import Optional, Dict, List, Tuple, Any
 from dataclasses import dataclass
 from enum import Enum
-import functools
+import hashlib
 from pathlib import Path
 
 from google_auth import GoogleAPIAuth
@@ -66,13 +72,144 @@ def setup_secure_logging() -> logging.Logger:
     
     return logger
 
+# Substrings (casefolded) that mark a notification as a missed call
+MISSED_CALL_KEYWORDS = tuple(k.casefold() for k in ('missed call', 'elmulasztott', 'hívás'))
+
+# Poll every 30s while calls arrive, doubling per empty poll up to 5 minutes when idle
+POLL_INTERVAL = 30
+MAX_POLL_INTERVAL = 300
+
+# Template file for manually reported missed calls, relative to the working directory
+MANUAL_CALLS_FILE = Path('manual_missed_calls.txt')
+
+# Vnode changes that mean the manual calls file was edited or replaced (kqueue only)
+_MANUAL_FILE_NOTES = (getattr(select, 'KQ_NOTE_WRITE', 0) | getattr(select, 'KQ_NOTE_EXTEND', 0) |
+                      getattr(select, 'KQ_NOTE_DELETE', 0) | getattr(select, 'KQ_NOTE_RENAME', 0))
+
+# osascript fallback for notifications: title, subtitle and message are passed as run handler arguments
+_NOTIFY_OSASCRIPT = (
+    'osascript',
+    '-e', 'on run argv',
+    '-e', 'display notification (item 3 of argv) with title (item 1 of argv) subtitle (item 2 of argv)',
+    '-e', 'end run',
+)
+
+# Calendar API accepts at most 50 calls in one batch request
+CALENDAR_BATCH_LIMIT = 50
+
+# Idle polls between "still monitoring" log lines
+IDLE_LOG_TICKS = 10
+
+# Callback window: 16 x 15-minute slots from 6 PM to 10 PM Budapest time (UTC+2)
+_WINDOW_START_HOUR = 18
+_WINDOW_START = datetime.min.time().replace(hour=_WINDOW_START_HOUR)
+_WINDOW_SLOTS = 16
+_WINDOW_MASK = (1 << _WINDOW_SLOTS) - 1
+_SLOT = timedelta(minutes=15)
+_WINDOW_LEN = _SLOT * _WINDOW_SLOTS
+_TZ_OFFSET = timedelta(hours=2)
+
+# Manual file entries: non-comment 'time | caller' lines, matched across the whole file at once
+_MANUAL_LINE_RE = re.compile(r'^[ \t]*([^#\s|][^|\n]*)\|([^\n]*)$', re.MULTILINE)
+
+# Manual file timestamps: 'YYYY-MM-DD HH:MM'
+_TIME_RE = re.compile(r'(\d{4})-(\d{2})-(\d{2}) (\d{2}):(\d{2})')
+
+# macOS NotificationCenter store; delivered_date is seconds since 2001-01-01 (Core Data epoch)
+NOTIFICATION_DB_PATH = Path.home() / 'Library' / 'Application Support' / 'NotificationCenter' / 'db2' / 'db'
+CORE_DATA_EPOCH_OFFSET = 978307200
+VIBER_BUNDLE_ID = 'com.viber.osx'
+# Constant text so sqlite3's statement cache compiles it once per connection
+VIBER_NOTIFICATIONS_SQL = '''SELECT datetime(delivered_date + ?, 'unixepoch', 'localtime') as time,
+                                  data, delivered_date FROM record
+                           WHERE bundleid = ?
+                           AND delivered_date > ?
+                           ORDER BY delivered_date DESC'''
+
+# Processed calls and per-caller counts live in SQLite so each update touches only the delta
+DATA_DIR = Path.home() / '.viber_scheduler' / 'data'
+STATE_DB_PATH = DATA_DIR / 'state.db'
+
+# Processed call IDs are only needed while their call can still be reported again
+# (manual entries are accepted for 48 hours), so older rows are evicted
+PROCESSED_TTL_DAYS = 7
+STATE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS processed (
+    call_id TEXT PRIMARY KEY,
+    processed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS caller_counts (
+    caller TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+'''
+
+def parse_event_time(value: str) -> datetime:
+    """Parse a Calendar API dateTime as naive wall-clock time in its own offset"""
+    if value.endswith('Z'):
+        # datetime.fromisoformat only accepts a 'Z' suffix from Python 3.11
+        value = value[:-1] + '+00:00'
+    return datetime.fromisoformat(value).replace(tzinfo=None)
+
+def _line_number(text: str, match: re.Match, first_line: int = 1) -> int:
+    """Line of a regex match in a chunk starting at first_line, only computed when a warning needs it"""
+    return text.count('\n', 0, match.start()) + first_line
+
+def open_state_db(db_path: Path) -> sqlite3.Connection:
+    """Open the tracker state database, creating it with owner-only permissions"""
+    if not db_path.exists():
+        db_path.touch(mode=0o600)
+    conn = sqlite3.connect(str(db_path))
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.executescript(STATE_SCHEMA)
+    return conn
+
+def _call_datetime(value) -> datetime:
+    """Call time as a datetime; notification times arrive as 'YYYY-MM-DD HH:MM:SS' strings"""
+    return value if isinstance(value, datetime) else datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+
+def make_call_id(time_str: str, caller: str) -> str:
+    """Fixed-size (24 hex chars) ID of one missed call, stable across runs"""
+    # Only the minute counts, so a notification (HH:MM:SS) and a manual entry (HH:MM) share an ID
+    return hashlib.blake2b(f'{time_str[:16]}|{caller}'.encode(), digest_size=12).hexdigest()
+
+def legacy_call_id(call_id: str) -> str:
+    """Convert a '<time>_<caller>' ID from before hashing; the time part never contains '_'"""
+    time_str, _, caller = call_id.partition('_')
+    return make_call_id(time_str, caller)
+
+MONITOR_PID_FILE = Path.home() / '.viber_scheduler' / 'monitor.pid'
+
+def write_pid_file() -> None:
+    """Record the monitor PID so supervisors can probe liveness with one syscall"""
+    MONITOR_PID_FILE.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+    MONITOR_PID_FILE.write_text(str(os.getpid()))
+    
+    def remove_pid_file():
+        try:
+            if MONITOR_PID_FILE.read_text().strip() == str(os.getpid()):
+                MONITOR_PID_FILE.unlink()
+        except OSError:
+            pass
+    
+    atexit.register(remove_pid_file)
+    # launchctl unload sends SIGTERM, which skips atexit handlers unless it becomes a normal exit
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+# Characters stripped from caller names: markup/quote characters and C0/C1 controls
+_SANITIZE_RE = re.compile(r'[<>"\'\\\x00-\x1f\x7f-\x9f]')
+
 def validate_caller_name(name: str) -> str:
     """Validate and sanitize caller names"""
     if not name or not isinstance(name, str):
         raise SecurityError("Invalid caller name")
     
     # Remove potentially dangerous characters
-    sanitized = re.sub(r'[<>"\'\\\x00-\x1f\x7f-\x9f]', '', name.strip())
+    sanitized = _SANITIZE_RE.sub('', name.strip())
     
     if len(sanitized) > 100:
         sanitized = sanitized[:100]
@@ -110,128 +247,191 @@ def secure_subprocess_run(cmd: List[str], timeout: int = 30) -> OperationResult:
         return OperationResult(False, error=f"Subprocess error: {str(e)}")
 
 class ViberMissedCallTracker:
+    # Caller name patterns, tried in order against the notification text
+    # This is a simplified approach - Viber notification format may vary
+    # Common patterns: "Missed call from [Name]" or similar
+    _CALLER_PATTERNS = tuple(re.compile(p, re.IGNORECASE) for p in (
+        r'from\s+([^,\n]+)',
+        r'([^:]+):\s*missed',
+        r'hívás\s+([^,\n]+)',
+    ))
+    
     def __init__(self):
         # Initialize secure logging
         self.logger = setup_secure_logging()
         self.logger.info("Initializing Viber Missed Call Tracker with security enhancements")
         
         try:
-            self.auth = GoogleAPIAuth()
-            self.calendar = self.auth.get_calendar_service()
-            self.processed_calls = set()
-            self.missed_call_counts = {}
+            self._auth = None  # Created on first calendar access, see the auth property
+            self.missed_call_counts = Counter()
             self.last_notification_check = datetime.now()
-            
-            # Create secure data directory
-            self.data_dir = Path.home() / '.viber_scheduler' / 'data'
+            self._nc_conn = None  # Read-only NotificationCenter connection, opened on first poll
+            self._nc_cursor = None  # delivered_date of the newest notification whose calls are all handled
+            self._nc_seen = None  # delivered_date of the newest notification read this cycle
+            self._manual_cache = None  # ((mtime_ns, size), parsed entries) of manual_missed_calls.txt
+            self._manual_read = None  # (inode, offset, next line number, digest of bytes before offset, complete-line entries)
+            self._idle_ticks = 0  # Consecutive polls that found no new calls
+            self._slot_cursor = None  # Busy-slot mask of the current cycle, claimed follow-ups included
+            
+            # Create secure data directory and state database
+            self.data_dir = DATA_DIR
             self.data_dir.mkdir(parents=True, exist_ok=True, mode=0o700)
+            self._db = open_state_db(STATE_DB_PATH)
             
             self.load_processed_data()
+            
+            # Poll only the sources this machine actually has; both run every cycle
+            self._sources = []
+            if NOTIFICATION_DB_PATH.exists():
+                self._sources.append(self.check_viber_notifications)
+            else:
+                self.logger.warning("Notification database not found, using manual missed calls only")
+            if not MANUAL_CALLS_FILE.exists():
+                self._create_manual_template()
+            self._sources.append(self.monitor_viber_activity)
+            
             self.logger.info("Viber Missed Call Tracker initialized successfully")
             
         except Exception as e:
             self.logger.error(f"Failed to initialize tracker: {str(e)}")
             raise
         
+    @property
+    def auth(self):
+        """Google API auth, created on first use so startup stays offline"""
+        if self._auth is None:
+            self._auth = GoogleAPIAuth()
+        return self._auth
+    
+    @property
+    def calendar(self):
+        """Calendar service; GoogleAPIAuth builds it once and keeps its token fresh"""
+        return self.auth.get_calendar_service()
+    
     def load_processed_data(self):
-        """Load previously processed calls and missed call counts"""
+        """Load missed call counts, migrating the legacy JSON data file once"""
         data_file = self.data_dir / 'viber_missed_calls.json'
         
-        try:
-            if data_file.exists():
-                with open(data_file, 'r') as f:
-                    data = json.load(f)
-                    self.processed_calls = set(data.get('processed_calls', []))
-                    self.missed_call_counts = data.get('missed_call_counts', {})
-                    self.logger.info(f"Loaded {len(self.processed_calls)} processed calls")
-            else:
-                self.logger.info("No existing data file found, starting fresh")
-        except FileNotFoundError:
-            self.processed_calls = set()
-            self.missed_call_counts = {}
+        if data_file.exists():
+            with open(data_file, 'r') as f:
+                data = json.load(f)
+            
+            with self._db:
+                self._db.executemany('INSERT OR IGNORE INTO processed (call_id) VALUES (?)',
+                                     ((legacy_call_id(call_id),) for call_id in data.get('processed_calls', [])))
+                self._db.executemany('INSERT OR IGNORE INTO caller_counts (caller, count) VALUES (?, ?)',
+                                     data.get('missed_call_counts', {}).items())
+                if data.get('last_updated'):
+                    self._db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('last_updated', ?)",
+                                     (data['last_updated'],))
+            
+            # Keep the old file as a backup, out of the way of future migrations
+            data_file.rename(data_file.with_suffix('.json.migrated'))
+            self.logger.info("Migrated legacy JSON data file into the state database")
+        
+        with self._db:
+            self._evict_processed()
+        
+        self.missed_call_counts = Counter(dict(self._db.execute('SELECT caller, count FROM caller_counts')))
+        processed_count = self._db.execute('SELECT COUNT(*) FROM processed').fetchone()[0]
+        if processed_count:
+            self.logger.info(f"Loaded {processed_count} processed calls")
+        else:
+            self.logger.info("No existing data found, starting fresh")
+    
+    def _is_processed(self, call_id):
+        """Indexed membership test against the processed calls table"""
+        return self._db.execute('SELECT 1 FROM processed WHERE call_id = ?', (call_id,)).fetchone() is not None
+    
+    def _mark_processed(self, call_id):
+        self._db.execute('INSERT OR IGNORE INTO processed (call_id) VALUES (?)', (call_id,))
+    
+    def _evict_processed(self):
+        """Drop processed call IDs older than PROCESSED_TTL_DAYS"""
+        evicted = self._db.execute("DELETE FROM processed WHERE processed_at < datetime('now', ?)",
+                                   (f'-{PROCESSED_TTL_DAYS} days',)).rowcount
+        if evicted:
+            self.logger.info(f"Evicted {evicted} processed calls older than {PROCESSED_TTL_DAYS} days")
+    
+    def _bump_caller_count(self, caller_name, calls=1):
+        self._db.execute('''INSERT INTO caller_counts (caller, count) VALUES (?, ?)
+                            ON CONFLICT(caller) DO UPDATE SET count = count + excluded.count''',
+                         (caller_name, calls))
     
     def save_processed_data(self):
-        """Save processed calls and missed call counts"""
-        data_file = self.data_dir / 'viber_missed_calls.json'
-        
+        """Stamp the update time and commit this cycle's state changes in one transaction"""
         try:
-            data = {
-                'processed_calls': list(self.processed_calls),
-                'missed_call_counts': self.missed_call_counts,
-                'last_updated': datetime.now().isoformat()
-            }
-            
-            # Write to temp file first, then atomic rename
-            temp_file = data_file.with_suffix('.json.tmp')
-            with open(temp_file, 'w') as f:
-                json.dump(data, f, indent=2)
+            with self._db:
+                self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_updated', ?)",
+                                 (datetime.now().isoformat(),))
+                self._evict_processed()
             
-            # Set secure permissions
-            temp_file.chmod(0o600)
-            
-            # Atomic rename
-            temp_file.rename(data_file)
-            
-            self.logger.info(f"Saved {len(self.processed_calls)} processed calls to secure storage")
+            self.logger.info("Saved processed calls to secure storage")
             
         except Exception as e:
             self.logger.error(f"Failed to save data: {str(e)}")
             raise
     
+    def _notification_db(self):
+        """Open (once) a read-only connection to the NotificationCenter database"""
+        if self._nc_conn is None:
+            # mode=ro keeps WAL visibility, so each query sees notifications Apple just wrote
+            self._nc_conn = sqlite3.connect(f"{NOTIFICATION_DB_PATH.as_uri()}?mode=ro", uri=True,
+                                            timeout=10)
+        return self._nc_conn
+    
     def check_viber_notifications(self):
         """Monitor macOS notification database for Viber missed call notifications"""
+        # Forget the previous cycle's rows so a failed query never advances the cursor
+        self._nc_seen = None
         try:
             self.logger.info("Checking Viber notifications for missed calls")
             
             # Secure database path validation
-            db_path = Path.home() / 'Library' / 'Application Support' / 'NotificationCenter' / 'db2' / 'db'
-            if not db_path.exists():
+            if not NOTIFICATION_DB_PATH.exists():
                 self.logger.warning("Notification database not found")
                 return []
             
-            # Prepare secure SQL query
-            query = '''SELECT datetime(delivered_date + 978307200, 'unixepoch', 'localtime') as time, 
-                              data FROM record 
-                       WHERE bundleid = 'com.viber.osx' 
-                       AND delivered_date > (strftime('%s', datetime('now', '-1 hour')) - 978307200)
-                       ORDER BY delivered_date DESC;'''
+            # Notifications delivered within the last hour, newer than those already handled
+            cutoff = time.time() - 3600 - CORE_DATA_EPOCH_OFFSET
+            if self._nc_cursor is not None:
+                cutoff = max(cutoff, self._nc_cursor)
             
-            # Execute with secure subprocess
-            cmd = ['sqlite3', str(db_path), query]
-            result = secure_subprocess_run(cmd, timeout=10)
-            
-            if not result.success:
-                self.logger.error(f"Failed to query notification database: {result.error}")
+            try:
+                rows = self._notification_db().execute(
+                    VIBER_NOTIFICATIONS_SQL, (CORE_DATA_EPOCH_OFFSET, VIBER_BUNDLE_ID, cutoff)).fetchall()
+            except sqlite3.Error as e:
+                self.logger.error(f"Failed to query notification database: {e}")
+                # Reopen on the next poll in case the database was replaced
+                if self._nc_conn is not None:
+                    self._nc_conn.close()
+                    self._nc_conn = None
                 return []
             
-            if result.data['returncode'] == 0:
-                notifications = result.data['stdout'].strip().split('\n')
-                return self.parse_viber_notifications(notifications)
-            else:
-                self.logger.warning(f"Database query returned error code: {result.data['returncode']}")
-                return []
+            # Rows are newest first; the cursor moves here once the cycle handled them all
+            if rows:
+                self._nc_seen = rows[0][2]
+            return self.parse_viber_notifications(rows)
                 
         except Exception as e:
             self.logger.error(f"Error checking notifications: {e}")
             return []
     
     def parse_viber_notifications(self, notifications):
-        """Parse Viber notifications for missed calls"""
+        """Parse Viber notification (time, data, delivered_date) rows for missed calls"""
         missed_calls = []
         
-        for notification in notifications:
-            if not notification.strip():
-                continue
-                
-            parts = notification.split('|')
-            if len(parts) < 2:
+        for time_str, notification_data, _ in notifications:
+            if not notification_data:
                 continue
-                
-            time_str = parts[0]
-            notification_data = parts[1]
             
-            # Look for missed call indicators in the notification
-            if any(keyword in notification_data.lower() for keyword in ['missed call', 'elmulasztott', 'hívás']):
+            # The data column is a BLOB; decode whatever text it carries
+            if isinstance(notification_data, bytes):
+                notification_data = notification_data.decode('utf-8', errors='ignore')
+            
+            # Look for missed call indicators in the notification (casefolded once per line)
+            folded = notification_data.casefold()
+            if any(keyword in folded for keyword in MISSED_CALL_KEYWORDS):
                 # Try to extract caller name from notification
                 caller = self.extract_caller_from_notification(notification_data)
                 if caller:
@@ -245,16 +445,8 @@ class ViberMissedCallTracker:
     
     def extract_caller_from_notification(self, notification_data):
         """Extract caller name from notification data"""
-        # This is a simplified approach - Viber notification format may vary
-        # Common patterns: "Missed call from [Name]" or similar
-        patterns = [
-            r'from\s+([^,\n]+)',
-            r'([^:]+):\s*missed',
-            r'hívás\s+([^,\n]+)',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, notification_data, re.IGNORECASE)
+        for pattern in self._CALLER_PATTERNS:
+            match = pattern.search(notification_data)
             if match:
                 return match.group(1).strip()
         
@@ -272,97 +464,138 @@ class ViberMissedCallTracker:
             return self.check_manual_missed_calls()
             
         except Exception as e:
-            print(f"Error monitoring Viber activity: {e}")
+            self.logger.error(f"Error monitoring Viber activity: {e}")
             return []
     
+    def _create_manual_template(self):
+        """Create the example manual missed calls file with secure permissions"""
+        try:
+            with open(MANUAL_CALLS_FILE, 'w') as f:
+                f.write("# Add missed calls manually for testing:\n")
+                f.write("# Format: YYYY-MM-DD HH:MM | Caller Name\n")
+                f.write("# Example: 2025-09-11 14:30 | János Kovács\n")
+                f.write("\n")
+            MANUAL_CALLS_FILE.chmod(0o600)
+            self.logger.info("Created manual missed calls template file")
+        except Exception as e:
+            self.logger.error(f"Failed to create template file: {e}")
+    
     def check_manual_missed_calls(self):
         """Manual missed call detection with security validation"""
-        missed_calls_file = Path('manual_missed_calls.txt')
+        missed_calls_file = MANUAL_CALLS_FILE
         
         if not missed_calls_file.exists():
-            # Create example file with secure permissions
-            try:
-                with open(missed_calls_file, 'w') as f:
-                    f.write("# Add missed calls manually for testing:\n")
-                    f.write("# Format: YYYY-MM-DD HH:MM | Caller Name\n")
-                    f.write("# Example: 2025-09-11 14:30 | János Kovács\n")
-                    f.write("\n")
-                missed_calls_file.chmod(0o600)
-                self.logger.info("Created manual missed calls template file")
-            except Exception as e:
-                self.logger.error(f"Failed to create template file: {e}")
+            self._create_manual_template()
             return []
         
-        # Security: Check file size limit
         try:
-            if missed_calls_file.stat().st_size > 1024 * 1024:  # 1MB limit
-                self.logger.error("Manual missed calls file too large")
-                return []
+            stat = missed_calls_file.stat()
         except Exception as e:
             self.logger.error(f"Error checking file size: {e}")
+            self._manual_cache = None
             return []
         
+        # Re-read only after the file has been edited. A version that cannot be read is
+        # cached too (with the lines parsed before it), so it is reported once and
+        # _wait_for_change does not see it as a fresh edit on every pass
+        cache_key = (stat.st_mtime_ns, stat.st_size)
+        if self._manual_cache and self._manual_cache[0] == cache_key:
+            entries = self._manual_cache[1]
+        elif stat.st_size > 1024 * 1024:  # Security: 1MB limit
+            self.logger.error("Manual missed calls file too large")
+            self._manual_cache = (cache_key, [])
+            return []
+        else:
+            try:
+                entries = self._read_manual_missed_calls(missed_calls_file, stat)
+            except Exception as e:
+                self.logger.error(f"Error reading manual missed calls: {e}")
+                entries = self._manual_read[4] if self._manual_read else []
+            self._manual_cache = (cache_key, entries)
+        
+        now = datetime.now()
+        tomorrow = now + timedelta(days=1)
+        cutoff = now - timedelta(hours=48)  # 48 hours to handle weekend sleeps
         missed_calls = []
-        try:
-            with open(missed_calls_file, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-                
-            for line_num, line in enumerate(lines, 1):
-                line = line.strip()
-                if line.startswith('#') or not line:
-                    continue
-                    
-                if '|' in line:
-                    try:
-                        time_str, caller_raw = line.split('|', 1)
-                        time_str = time_str.strip()
-                        
-                        # Validate and sanitize caller name
-                        caller = validate_caller_name(caller_raw.strip())
-                        
-                        # Parse the time with validation
-                        call_time = datetime.strptime(time_str, '%Y-%m-%d %H:%M')
-                        
-                        # Validate date is reasonable
-                        now = datetime.now()
-                        if call_time > now + timedelta(days=1):
-                            self.logger.warning(f"Line {line_num}: Future date ignored: {time_str}")
-                            continue
-                            
-                        # Process calls from today and yesterday (handles sleep/wake scenarios)
-                        time_diff = now - call_time
-                        if time_diff < timedelta(hours=48):  # 48 hours to handle weekend sleeps
-                            call_id = f"{time_str}_{caller}"
-                            if call_id not in self.processed_calls:
-                                missed_calls.append({
-                                    'time': call_time,
-                                    'caller': caller,
-                                    'call_id': call_id
-                                })
-                                
-                    except ValueError as e:
-                        self.logger.warning(f"Line {line_num}: Invalid format - {e}")
-                    except SecurityError as e:
-                        self.logger.error(f"Line {line_num}: Security error - {e}")
-                        
-        except Exception as e:
-            self.logger.error(f"Error reading manual missed calls: {e}")
+        for entry in entries:
+            # Process calls from today and yesterday (handles sleep/wake scenarios)
+            if cutoff < entry['time'] <= tomorrow and not self._is_processed(entry['call_id']):
+                missed_calls.append(dict(entry))
         
         self.logger.info(f"Found {len(missed_calls)} new manual missed calls")
         return missed_calls
     
-    def get_next_callback_time(self, caller_name):
-        """Get the next available callback time starting from 6 PM"""
+    def _read_manual_missed_calls(self, missed_calls_file, stat):
+        """Parse only what was appended to the manual file since the last read"""
+        inode, offset, line_no, digest, complete = self._manual_read or (None, 0, 1, None, [])
+        
+        # At most 1MB (checked by the caller); hashing it is cheap next to parsing it again
+        data = missed_calls_file.read_bytes()
+        if stat.st_ino != inode or hashlib.blake2b(data[:offset], digest_size=16).digest() != digest:
+            # Replaced, truncated or edited before the offset: start over
+            offset, line_no, complete = 0, 1, []
+        data, consumed = data[offset:], data[:offset]
+        
+        # Only whole lines advance the offset; a line still being typed is re-read next time
+        end = data.rfind(b'\n') + 1
+        text = data[:end].decode('utf-8')
+        complete = complete + self._parse_manual_missed_calls(text, line_no)
+        
+        offset += end
+        digest = hashlib.blake2b(consumed + data[:end], digest_size=16).digest()
+        self._manual_read = (stat.st_ino, offset, line_no + text.count('\n'), digest, complete)
+        
+        partial = data[end:].decode('utf-8', errors='replace')
+        return complete + self._parse_manual_missed_calls(partial, line_no + text.count('\n'))
+    
+    def _parse_manual_missed_calls(self, text, first_line=1):
+        """Parse every valid 'YYYY-MM-DD HH:MM | Caller' line of a chunk of the manual file"""
+        entries = []
+        tomorrow = datetime.now() + timedelta(days=1)
+        
+        # Blank, comment and '|'-less lines never match, so the loop only sees candidate entries
+        for line in _MANUAL_LINE_RE.finditer(text):
+            try:
+                time_str = line[1].strip()
+                
+                # Validate and sanitize caller name
+                caller = validate_caller_name(line[2].strip())
+                
+                # Parse the time with validation (datetime() rejects out-of-range fields)
+                m = _TIME_RE.fullmatch(time_str)
+                if not m:
+                    raise ValueError(f"time data {time_str!r} does not match format 'YYYY-MM-DD HH:MM'")
+                call_time = datetime(int(m[1]), int(m[2]), int(m[3]), int(m[4]), int(m[5]))
+                
+                # Kept: the offset reader never parses this line again, and check_manual_missed_calls
+                # only picks it up once it falls inside the window
+                if call_time > tomorrow:
+                    self.logger.warning(f"Line {_line_number(text, line, first_line)}: Future date, not scheduled yet: {time_str}")
+                
+                entries.append({
+                    'time': call_time,
+                    'caller': caller,
+                    'call_id': make_call_id(time_str, caller)
+                })
+                        
+            except ValueError as e:
+                self.logger.warning(f"Line {_line_number(text, line, first_line)}: Invalid format - {e}")
+            except SecurityError as e:
+                self.logger.error(f"Line {_line_number(text, line, first_line)}: Security error - {e}")
+        
+        return entries
+    
+    def _fetch_callback_window_events(self):
+        """Fetch today's 6-10 PM calendar events once for a whole polling cycle"""
+        base_time = datetime.combine(datetime.now().date(), _WINDOW_START)  # 6 PM today
+        
         try:
-            today = datetime.now().date()
-            base_time = datetime.combine(today, datetime.min.time().replace(hour=18, minute=0))  # 6 PM today
-            
             # Convert to UTC for API query (subtract 2 hours for Europe/Budapest timezone)
-            base_time_utc = base_time - timedelta(hours=2)
+            base_time_utc = base_time - _TZ_OFFSET
             
             # Get events for today starting from 6 PM local time (4 PM UTC) to 10 PM local time (8 PM UTC)
             time_min = base_time_utc.isoformat() + 'Z'
-            time_max = (base_time_utc + timedelta(hours=4)).isoformat() + 'Z'  # Until 10 PM local
+            time_max = (base_time_utc + _WINDOW_LEN).isoformat() + 'Z'  # Until 10 PM local
             
             events_result = self.calendar.events().list(
                 calendarId='primary',
@@ -374,55 +607,65 @@ class ViberMissedCallTracker:
             
             existing_events = events_result.get('items', [])
             
-            print(f"   🔍 Found {len(existing_events)} existing events between 6-10 PM")
+            self.logger.info(f"Found {len(existing_events)} existing events between 6-10 PM")
+            return existing_events, base_time
             
-            # Find next available 15-minute slot
-            current_slot = base_time
-            for i in range(16):  # Check 4 hours worth of 15-minute slots
-                slot_end = current_slot + timedelta(minutes=15)
-                
-                # Check if this slot conflicts with existing events
-                slot_free = True
-                for event in existing_events:
-                    event_start_str = event['start'].get('dateTime', event['start'].get('date'))
-                    event_end_str = event['end'].get('dateTime', event['end'].get('date'))
-                    
-                    # Parse datetime strings properly
-                    try:
-                        if 'T' in event_start_str:
-                            # Remove timezone info for comparison
-                            event_start = datetime.fromisoformat(event_start_str.split('+')[0].split('Z')[0])
-                            event_end = datetime.fromisoformat(event_end_str.split('+')[0].split('Z')[0])
-                        else:
-                            # All-day event, skip
-                            continue
-                            
-                        # Check for conflict
-                        if (current_slot < event_end and slot_end > event_start):
-                            print(f"   ❌ Slot {current_slot.strftime('%H:%M')} conflicts with: {event.get('summary', 'Event')}")
-                            slot_free = False
-                            break
-                    except Exception as e:
-                        print(f"   ⚠️ Error parsing event time: {e}")
-                        continue
-                
-                if slot_free:
-                    print(f"   ✅ Found free slot: {current_slot.strftime('%H:%M')}")
-                    return current_slot
-                
-                current_slot += timedelta(minutes=15)
+        except Exception as e:
+            self.logger.error(f"Error fetching calendar events: {e}")
+            # Fall back to scheduling from 6 PM without conflict data
+            return [], base_time
+    
+    def _busy_slot_mask(self, existing_events, base_time):
+        """One bit per 15-minute slot from 6 PM; set bits are slots overlapped by an event"""
+        busy = 0
+        for event in existing_events:
+            if 'dateTime' not in event['start']:
+                # All-day event, skip
+                continue
+            try:
+                event_start = parse_event_time(event['start']['dateTime'])
+                event_end = parse_event_time(event['end']['dateTime'])
+            except Exception as e:
+                self.logger.warning(f"Error parsing event time: {e}")
+                continue
             
-            # If no free slot found, default to 10 PM
-            return base_time.replace(hour=22, minute=0)
+            first = max(0, (event_start - base_time) // _SLOT)
+            last = min(_WINDOW_SLOTS, -((base_time - event_end) // _SLOT))  # Rounded up, exclusive
+            if last > first:
+                busy |= ((1 << (last - first)) - 1) << first
+        return busy
+    
+    def _first_free_slot(self, busy):
+        """Index of the lowest clear bit of 4 hours worth of slots, None when all are taken"""
+        free = ~busy & _WINDOW_MASK
+        if not free:
+            return None
+        return (free & -free).bit_length() - 1
+    
+    def _allocate_slot(self, existing_events, base_time):
+        """Claim the next free slot from 6 PM; existing events are only parsed for the first claim of a cycle"""
+        try:
+            if self._slot_cursor is None:
+                self._slot_cursor = self._busy_slot_mask(existing_events, base_time)
+            
+            index = self._first_free_slot(self._slot_cursor)
+            if index is None:
+                # If no free slot found, default to 10 PM
+                return base_time + _WINDOW_LEN
+            
+            # Later callers in this cycle must skip the slot we just claimed
+            self._slot_cursor |= 1 << index
+            current_slot = base_time + _SLOT * index
+            self.logger.info(f"Allocated slot: {current_slot.strftime('%H:%M')}")
+            return current_slot
             
         except Exception as e:
-            print(f"Error finding callback time: {e}")
+            self.logger.error(f"Error finding callback time: {e}")
             # Fallback to 6 PM
-            today = datetime.now().date()
-            return datetime.combine(today, datetime.min.time().replace(hour=18, minute=0))
+            return base_time
     
-    def create_calendar_followup(self, caller_name, call_time, missed_count):
-        """Create a follow-up task scheduled from 6 PM onward in Google Calendar"""
+    def create_calendar_followup(self, caller_name, call_time, missed_count, existing_events, base_time):
+        """Build a follow-up event scheduled from 6 PM onward; inserted later in a batch"""
         try:
             # Parse call time
             if isinstance(call_time, str):
@@ -430,8 +673,8 @@ class ViberMissedCallTracker:
             else:
                 call_datetime = call_time
             
-            # Get next available slot starting from 6 PM
-            followup_time = self.get_next_callback_time(caller_name)
+            # Claim the next available slot starting from 6 PM
+            followup_time = self._allocate_slot(existing_events, base_time)
             
             # Create event title and description in English
             if missed_count == 1:
@@ -457,7 +700,7 @@ class ViberMissedCallTracker:
                     'timeZone': 'Europe/Budapest',
                 },
                 'end': {
-                    'dateTime': (followup_time + timedelta(minutes=15)).isoformat(),
+                    'dateTime': (followup_time + _SLOT).isoformat(),
                     'timeZone': 'Europe/Budapest',
                 },
                 'reminders': {
@@ -468,21 +711,43 @@ class ViberMissedCallTracker:
                 },
             }
             
-            # Use primary calendar
-            created_event = self.calendar.events().insert(
-                calendarId='primary', 
-                body=event
-            ).execute()
-            
-            print(f"✅ Calendar event created: {title}")
-            print(f"   Time: {followup_time.strftime('%H:%M')} ({followup_time.strftime('%Y-%m-%d')})")
-            
-            return created_event['id'], followup_time
+            return event, followup_time
             
         except Exception as e:
-            print(f"❌ Error creating calendar event: {e}")
+            self.logger.error(f"Error creating calendar event: {e}")
             return None, None
     
+    def _insert_events(self, pending):
+        """Insert pending follow-ups into the primary calendar, one batch HTTP request per 50"""
+        if not pending:
+            return
+        
+        self._pending_inserts = pending
+        try:
+            calendar = self.calendar
+            for start in range(0, len(pending), CALENDAR_BATCH_LIMIT):
+                # A failed batch leaves its follow-ups without event IDs; later batches still run
+                try:
+                    batch = calendar.new_batch_http_request(callback=self._on_insert)
+                    for i in range(start, min(start + CALENDAR_BATCH_LIMIT, len(pending))):
+                        batch.add(calendar.events().insert(calendarId='primary', body=pending[i]['event']),
+                                  request_id=str(i))
+                    batch.execute()
+                except Exception as e:
+                    self.logger.error(f"Error creating calendar events: {e}")
+        except Exception as e:
+            self.logger.error(f"Error creating calendar events: {e}")
+        finally:
+            self._pending_inserts = None
+    
+    def _on_insert(self, request_id, response, exception):
+        """Batch callback: record the created event ID for each pending follow-up"""
+        item = self._pending_inserts[int(request_id)]
+        if exception is not None:
+            self.logger.error(f"Error creating calendar event for {item['caller']}: {exception}")
+        else:
+            item['event_id'] = response['id']
+    
     def send_notification(self, caller_name, call_time, missed_count, followup_time):
         """Send macOS notification about missed call and created follow-up"""
         if isinstance(call_time, str):
@@ -499,94 +764,171 @@ class ViberMissedCallTracker:
             subtitle = f"{caller_name} - URGENT"
             message = f"Last call: {call_datetime.strftime('%H:%M')}\n⚠️ {missed_count} missed calls!\n✅ Callback scheduled: {followup_time.strftime('%H:%M')}"
         
-        applescript = f'''
-        display notification "{message}" with title "{title}" subtitle "{subtitle}"
-        '''
-        
         try:
-            subprocess.run(['osascript', '-e', applescript], check=True)
+            # Constant script; the strings only ever travel as argv, never as AppleScript source
+            result = secure_subprocess_run(list(_NOTIFY_OSASCRIPT) + [title, subtitle, message], timeout=10)
+            if not result.success or result.data['returncode'] != 0:
+                self.logger.warning(f"Notification error: {result.error or result.data['stderr'].strip()}")
         except Exception as e:
-            print(f"Notification error: {e}")
+            self.logger.warning(f"Notification error: {e}")
     
     def process_missed_calls(self):
         """Process new missed calls and create follow-up tasks"""
-        # Try notification monitoring first
-        missed_calls = self.check_viber_notifications()
+        # Claimed slots are only valid for this cycle's calendar window
+        self._slot_cursor = None
         
-        # Fallback to manual monitoring
-        if not missed_calls:
-            missed_calls = self.monitor_viber_activity()
+        # Overlapping reports of the same call are coalesced below
+        missed_calls = []
+        for source in self._sources:
+            missed_calls.extend(source())
         
-        new_calls_processed = 0
+        # Reports of the same caller in the same minute are one call with one ID, whichever
+        # source or repeated notification they came from
+        reports = {}
         for call in missed_calls:
-            call_id = call.get('call_id', f"{call['time']}_{call['caller']}")
-            
-            # Skip if already processed
-            if call_id in self.processed_calls:
-                continue
-            
-            caller_name = call['caller']
             call_time = call['time']
+            minute = call_time.strftime('%Y-%m-%d %H:%M') if isinstance(call_time, datetime) else call_time
+            reports.setdefault(call.get('call_id') or make_call_id(minute, call['caller']), call)
+        
+        # Drop already processed calls before any per-call work, and group what is left by caller
+        fresh = {}
+        for call_id, call in reports.items():
+            if not self._is_processed(call_id):
+                fresh.setdefault(call['caller'], []).append((call_id, call))
+        
+        if not fresh:
+            self._advance_notification_cursor()
+            return 0
+        
+        # Calendar window is fetched on the first new call and reused for the rest
+        window = None
+        pending = []
+        
+        # One follow-up per caller, scheduled from their latest call and carrying the cumulative count
+        for caller_name, calls in fresh.items():
+            call_time = max((call['time'] for _, call in calls), key=_call_datetime)
+            missed_count = self.missed_call_counts[caller_name] + len(calls)
+            
+            shown_time = call_time.strftime('%Y-%m-%d %H:%M:%S') if isinstance(call_time, datetime) else call_time
+            self.logger.info(f"📞 New missed call: {caller_name} at {shown_time} "
+                             f"({len(calls)} new, {missed_count} from this person)")
+            
+            # Build calendar follow-up
+            if window is None:
+                window = self._fetch_callback_window_events()
+            existing_events, base_time = window
+            event, followup_time = self.create_calendar_followup(
+                caller_name, call_time, missed_count, existing_events, base_time)
+            
+            if event:
+                pending.append({
+                    'calls': len(calls),
+                    'call_ids': [call_id for call_id, _ in calls],
+                    'caller': caller_name,
+                    'time': call_time,
+                    'count': missed_count,
+                    'event': event,
+                    'followup_time': followup_time,
+                })
+        
+        # Create all follow-ups with a single batch request
+        self._insert_events(pending)
+        
+        new_calls_processed = 0
+        for item in pending:
+            if not item.get('event_id'):
+                continue
             
-            # Update missed call count for this caller
-            if caller_name not in self.missed_call_counts:
-                self.missed_call_counts[caller_name] = 0
-            self.missed_call_counts[caller_name] += 1
-            
-            missed_count = self.missed_call_counts[caller_name]
+            followup_time = item['followup_time']
+            self.logger.info(f"✅ Calendar event created: {item['event']['summary']} "
+                             f"at {followup_time.strftime('%Y-%m-%d %H:%M')}")
             
-            print(f"\n📞 New missed call: {caller_name}")
-            if isinstance(call_time, datetime):
-                print(f"   Time: {call_time.strftime('%Y-%m-%d %H:%M:%S')}")
-            else:
-                print(f"   Time: {call_time}")
-            print(f"   Missed calls from this person: {missed_count}")
+            # Send notification
+            self.send_notification(item['caller'], item['time'], item['count'], followup_time)
             
-            # Create calendar follow-up
-            event_id, followup_time = self.create_calendar_followup(caller_name, call_time, missed_count)
+            # Count the calls and mark them processed only once their follow-up exists,
+            # so a failed insert retried next cycle is not counted twice
+            new_calls = item['calls']
+            self.missed_call_counts[item['caller']] += new_calls
+            self._bump_caller_count(item['caller'], new_calls)
             
-            if event_id:
-                # Send notification
-                self.send_notification(caller_name, call_time, missed_count, followup_time)
-                
-                # Mark as processed
-                self.processed_calls.add(call_id)
-                new_calls_processed += 1
+            for call_id in item['call_ids']:
+                self._mark_processed(call_id)
+            new_calls_processed += new_calls
+        
+        # A follow-up that failed keeps its notifications inside the next query
+        if len(pending) == len(fresh) and all(item.get('event_id') for item in pending):
+            self._advance_notification_cursor()
         
         if new_calls_processed > 0:
-            print(f"\n✅ Processed {new_calls_processed} new missed calls")
+            self.logger.info(f"Processed {new_calls_processed} new missed calls")
             self.save_processed_data()
         
         return new_calls_processed
     
+    def _advance_notification_cursor(self):
+        """Skip notifications read this cycle on later polls; they are all processed"""
+        if self._nc_seen is not None:
+            self._nc_cursor = self._nc_seen
+            self._nc_seen = None
+    
     def check_wake_up_backlog(self):
         """Check for missed calls that happened while system was sleeping"""
-        print("🌅 Checking for missed calls while system was offline...")
+        self.logger.info("Checking for missed calls while system was offline")
         
         # Check if there's a significant gap since last update
-        try:
-            with open('viber_missed_calls.json', 'r') as f:
-                data = json.load(f)
-                last_updated_str = data.get('last_updated')
-                if last_updated_str:
-                    last_updated = datetime.fromisoformat(last_updated_str)
-                    time_since_last = datetime.now() - last_updated
-                    
-                    if time_since_last > timedelta(hours=2):
-                        print(f"⏰ System was offline for {int(time_since_last.total_seconds()//3600)} hours")
-                        print("🔍 Checking for backlog missed calls...")
-                        
-                        # Process any missed calls from the offline period
-                        backlog_calls = self.process_missed_calls()
-                        if backlog_calls > 0:
-                            print(f"✅ Processed {backlog_calls} missed calls from offline period")
-                        else:
-                            print("📭 No missed calls found during offline period")
-                    else:
-                        print("✅ System was recently active, no backlog check needed")
-        except FileNotFoundError:
-            print("📝 First time running, no backlog to check")
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'last_updated'").fetchone()
+        if not row:
+            self.logger.info("First time running, no backlog to check")
+            return
+        
+        last_updated = datetime.fromisoformat(row[0])
+        time_since_last = datetime.now() - last_updated
+        
+        if time_since_last > timedelta(hours=2):
+            self.logger.info(f"System was offline for {int(time_since_last.total_seconds()//3600)} hours, "
+                             f"checking for backlog missed calls")
+            
+            # Process any missed calls from the offline period
+            backlog_calls = self.process_missed_calls()
+            if backlog_calls > 0:
+                self.logger.info(f"Processed {backlog_calls} missed calls from offline period")
+            else:
+                self.logger.info("No missed calls found during offline period")
+        else:
+            self.logger.info("System was recently active, no backlog check needed")
 
+    def _wait_for_change(self, timeout):
+        """Sleep up to timeout seconds, waking early when the manual calls file changes"""
+        if not hasattr(select, 'kqueue'):
+            time.sleep(timeout)
+            return
+        
+        try:
+            # Open per wait: editors that save by rename leave a stale inode behind
+            fd = os.open(MANUAL_CALLS_FILE, getattr(os, 'O_EVTONLY', os.O_RDONLY))
+        except OSError:
+            time.sleep(timeout)
+            return
+        
+        kq = select.kqueue()
+        try:
+            event = select.kevent(fd, filter=select.KQ_FILTER_VNODE,
+                                  flags=select.KQ_EV_ADD | select.KQ_EV_CLEAR,
+                                  fflags=_MANUAL_FILE_NOTES)
+            kq.control([event], 0, 0)
+            
+            # An edit made since the last check (readable or not) would not raise an event any more
+            stat = os.fstat(fd)
+            if self._manual_cache and self._manual_cache[0] != (stat.st_mtime_ns, stat.st_size):
+                return
+            
+            if kq.control(None, 1, timeout):
+                self.logger.info("Manual missed calls file changed, checking now")
+        finally:
+            kq.close()
+            os.close(fd)
+    
     def run_monitor(self):
         """Main monitoring loop"""
         print("📞 Viber Missed Call Tracker Started")
@@ -604,48 +946,58 @@ class ViberMissedCallTracker:
                 new_calls = self.process_missed_calls()
                 
                 if new_calls == 0:
-                    print(".", end="", flush=True)  # Show activity
+                    self._idle_ticks += 1
+                    if self._idle_ticks % IDLE_LOG_TICKS == 0:
+                        self.logger.info(f"Still monitoring, no new calls in the last {self._idle_ticks} polls")
+                    sleep_s = min(POLL_INTERVAL * (2 ** min(self._idle_ticks, 4)), MAX_POLL_INTERVAL)
+                else:
+                    self._idle_ticks = 0
+                    sleep_s = POLL_INTERVAL
                 
-                # Wait 30 seconds before next check
-                time.sleep(30)
+                self._wait_for_change(sleep_s)
                 
         except KeyboardInterrupt:
-            print("\n\n🛑 Stopping Viber missed call tracker...")
+            self.logger.info("🛑 Stopping Viber missed call tracker (stopped by user)")
             self.save_processed_data()
+        except SystemExit:
+            self.logger.info("🛑 Stopping Viber missed call tracker (terminated)")
+            self.save_processed_data()
+            raise
         except Exception as e:
-            print(f"\n❌ Error in monitor: {e}")
+            self.logger.error(f"Error in monitor: {e}")
             self.save_processed_data()
 
 def view_missed_calls():
     """View tracked missed calls"""
+    if not STATE_DB_PATH.exists():
+        print("No missed calls data found yet.")
+        return
+    
+    conn = sqlite3.connect(f"{STATE_DB_PATH.as_uri()}?mode=ro", uri=True)
     try:
-        with open('viber_missed_calls.json', 'r') as f:
-            data = json.load(f)
-        
         print("📞 VIBER MISSED CALLS TRACKER")
         print("=" * 40)
         
-        missed_counts = data.get('missed_call_counts', {})
+        missed_counts = conn.execute('SELECT caller, count FROM caller_counts').fetchall()
         if missed_counts:
             print("\n📊 Missed call counts by contact:")
-            for caller_name, count in missed_counts.items():
+            for caller_name, count in missed_counts:
                 print(f"   {caller_name}: {count} missed calls")
         
-        processed_calls = data.get('processed_calls', [])
-        print(f"\n📈 Total processed calls: {len(processed_calls)}")
+        processed_total = conn.execute('SELECT COUNT(*) FROM processed').fetchone()[0]
+        print(f"\n📈 Total processed calls: {processed_total}")
         
-        last_updated = data.get('last_updated')
-        if last_updated:
-            print(f"Last updated: {last_updated}")
-            
-    except FileNotFoundError:
-        print("No missed calls data found yet.")
+        row = conn.execute("SELECT value FROM meta WHERE key = 'last_updated'").fetchone()
+        if row:
+            print(f"Last updated: {row[0]}")
+    finally:
+        conn.close()
 
 if __name__ == "__main__":
-    import sys
-    
     if len(sys.argv) > 1 and sys.argv[1] == "view":
         view_missed_calls()
     else:
+        # Record the PID before auth setup so supervisors see the monitor immediately
+        write_pid_file()
         tracker = ViberMissedCallTracker()
         tracker.run_monitor()
\ No newline at end of file